@@ -0,0 +1,79 @@
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# 对比的启动场景：轻量命令应在毫秒级完成，最后一项是导入 pandas 的基准开销
+STARTUP_COMMANDS = [
+    ("excel --help", ["-m", "excel", "--help"]),
+    ("excel check", ["-m", "excel", "check"]),
+    ("excel run --dry-run", ["-m", "excel", "run", "--dry-run"]),
+    ("python -c 'import pandas'", ["-c", "import pandas"]),
+]
+
+
+def _time_command(args, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = subprocess.run([sys.executable, *args], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings, result.returncode
+
+
+def bench_startup(repeat=5):
+    """
+    以子进程方式多次运行各个命令，输出启动耗时的最小值和中位数（毫秒）。
+    """
+    print(f"{'命令':<28}{'最小值(ms)':>12}{'中位数(ms)':>12}")
+    for label, args in STARTUP_COMMANDS:
+        timings, returncode = _time_command(args, repeat)
+        note = "" if returncode == 0 else f"  (退出码 {returncode})"
+        print(f"{label:<28}{min(timings):>12.1f}{statistics.median(timings):>12.1f}{note}")
+
+
+def _time_lookups(store, keys):
+    """返回 (按农户查询的平均耗时, 按村查询的平均耗时)，单位微秒。"""
+    started = time.perf_counter()
+    for village, farmer_name in keys:
+        store.find_farmer(village, farmer_name)
+    farmer_us = (time.perf_counter() - started) / len(keys) * 1e6
+
+    villages = sorted({village for village, _ in keys if village is not None})
+    started = time.perf_counter()
+    for village in villages:
+        store.find_village(village)
+    village_us = (time.perf_counter() - started) / max(len(villages), 1) * 1e6
+    return farmer_us, village_us
+
+
+def bench_stores(lookups=1000):
+    """
+    对 SQLITE_PATH 指向的本地存储和 .env 中配置的 MongoDB 分别执行相同数量的查询，
+    输出平均查询耗时（微秒）。未配置或无法连接的存储会被跳过。
+    """
+    from .loss_store import MongoLossStore, SQLiteLossStore
+
+    stores = [("sqlite", lambda: SQLiteLossStore(os.environ.get("SQLITE_PATH", "loss_data.sqlite3")))]
+    if all(os.getenv(name) for name in ("MONGODB_URI", "DB_NAME", "COLLECTION_NAME")):
+        stores.append(("mongodb", lambda: MongoLossStore(os.getenv("MONGODB_URI"), os.getenv("DB_NAME"), os.getenv("COLLECTION_NAME"))))
+    else:
+        print("未配置 MONGODB_URI、DB_NAME、COLLECTION_NAME，只测试 SQLite。")
+
+    print(f"{'存储':<10}{'记录数':>8}{'按农户(μs)':>14}{'按村(μs)':>14}")
+    for name, open_backend in stores:
+        try:
+            store = open_backend()
+            keys = store.keys(limit=lookups)
+        except Exception as e:
+            print(f"{name:<10}无法连接: {e}")
+            continue
+        try:
+            if not keys:
+                print(f"{name:<10}没有数据，请先执行 insert 导入模版文件。")
+                continue
+            farmer_us, village_us = _time_lookups(store, keys)
+            print(f"{name:<10}{len(keys):>8}{farmer_us:>14.1f}{village_us:>14.1f}")
+        finally:
+            store.close()
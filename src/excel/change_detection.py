@@ -0,0 +1,81 @@
+import os
+from openpyxl import load_workbook
+from openpyxl.utils import get_column_letter
+
+# 单次报告中最多逐条列出的变化单元格数量
+MAX_REPORTED_CHANGES = 20
+
+
+def values_equal(old_value, new_value):
+    """
+    比较单元格的旧值和新值。None 与空字符串视为相同，
+    因为 openpyxl 保存空字符串后再读取可能得到 None。
+    """
+    if old_value in (None, "") and new_value in (None, ""):
+        return True
+    return old_value == new_value
+
+
+def is_output_current(source_path, output_file_path):
+    """输出文件存在且不早于源文件时返回 True。"""
+    return os.path.exists(output_file_path) and os.path.getmtime(output_file_path) >= os.path.getmtime(source_path)
+
+
+def read_output_values(output_file_path, headers, header_row_index, first_data_row):
+    """
+    以只读模式读取已有输出文件中指定表头列的值。
+
+    Args:
+        output_file_path (str): 已有输出文件路径。
+        headers (list[str]): 需要读取的列的表头名称。
+        header_row_index (int): 表头所在行。
+        first_data_row (int): 开始读取数据的行。
+
+    Returns:
+        tuple: ({(行号, 表头名称): 单元格值}, 输出文件中存在的表头集合)。
+            输出文件中不存在的表头不会出现在值字典中。
+    """
+    wb = load_workbook(output_file_path, read_only=True)
+    try:
+        ws = wb.active
+        rows = ws.iter_rows(min_row=header_row_index, values_only=True)
+        header_values = next(rows, ())
+        cleaned_headers = [str(h).strip().replace('\n', '').replace('\r', '') if h is not None else '' for h in header_values]
+        column_positions = {h: cleaned_headers.index(h) for h in headers if h in cleaned_headers}
+
+        values = {}
+        for r_idx, row in enumerate(rows, start=header_row_index + 1):
+            if r_idx < first_data_row:
+                continue
+            for header, position in column_positions.items():
+                values[(r_idx, header)] = row[position] if position < len(row) else None
+        return values, set(column_positions)
+    finally:
+        wb.close()
+
+
+def diff_values(old_values, new_values, column_indexes):
+    """
+    对比新旧值，返回变化列表 [(单元格坐标, 旧值, 新值)]，按行、列排序。
+
+    Args:
+        old_values (dict): {(行号, 表头名称): 旧值}。
+        new_values (dict): {(行号, 表头名称): 新值}。
+        column_indexes (dict): {表头名称: 列号}，用于生成单元格坐标。
+    """
+    changes = []
+    for (r_idx, header) in sorted(new_values, key=lambda key: (key[0], column_indexes[key[1]])):
+        new_value = new_values[(r_idx, header)]
+        old_value = old_values.get((r_idx, header))
+        if not values_equal(old_value, new_value):
+            changes.append((f"{get_column_letter(column_indexes[header])}{r_idx}", old_value, new_value))
+    return changes
+
+
+def print_changes(filename, changes):
+    """输出变化的单元格，超过 MAX_REPORTED_CHANGES 条时只列出前面部分。"""
+    print(f"文件 '{filename}' 共有 {len(changes)} 个单元格发生变化:")
+    for coordinate, old_value, new_value in changes[:MAX_REPORTED_CHANGES]:
+        print(f"    {coordinate}: {old_value!r} → {new_value!r}")
+    if len(changes) > MAX_REPORTED_CHANGES:
+        print(f"    ……其余 {len(changes) - MAX_REPORTED_CHANGES} 处未列出")
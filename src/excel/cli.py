@@ -0,0 +1,223 @@
+import argparse
+import json
+import os
+import sys
+import time
+from dotenv import load_dotenv
+
+from .discovery import STAGES, discover_files, check_stage
+from .sharding import parse_shard, select_shard, RunReport, default_report_path, merge_reports, print_summary
+
+# 注意：pandas / openpyxl / pymongo 只在具体子命令内部导入，
+# 这样 --help、--dry-run 和 check 不需要为这些依赖付出启动时间。
+
+PIPELINE = ["convert", "format", "insert", "process"]
+
+
+def _shard_arg(value):
+    try:
+        return parse_shard(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def _stage_files(stage, shard):
+    """返回某个阶段将要处理的文件；指定分片时只返回分配给该分片的文件。"""
+    files = discover_files(stage)
+    if shard:
+        files = select_shard(files, os.getenv(STAGES[stage]["input"]), *shard)
+    return files
+
+
+def _print_dry_run(stages, shard=None):
+    shard_text = f"（分片 {shard[0]}/{shard[1]}）" if shard else ""
+    for stage in stages:
+        files = _stage_files(stage, shard)
+        print(f"[{stage}] {os.getenv(STAGES[stage]['input'])}{shard_text}：共 {len(files)} 个文件")
+        for path in files:
+            print(f"  {path}")
+
+
+def _make_report(args):
+    """指定了 --shard 或 --report 时返回 RunReport，否则返回 None。"""
+    if args.shard or args.report:
+        return RunReport(shard=args.shard)
+    return None
+
+
+def _write_report(args, report):
+    if report:
+        report.write(args.report or default_report_path(args.shard))
+
+
+def _run_stage(stage, shard=None, report=None, **options):
+    files = set(_stage_files(stage, shard)) if shard else None
+    started = time.perf_counter()
+
+    if stage == "convert":
+        from .convert_xls_to_xlsx import main as stage_main
+    elif stage == "format":
+        from .merged_cell_range import main as stage_main
+    elif stage == "insert":
+        from .insert_mongodb import main as stage_main
+    else:
+        from .file_processor import main as stage_main
+    stage_main(selected_files=files, report=report, **options)
+
+    if report:
+        report.stage_finished(stage, time.perf_counter() - started)
+
+
+def cmd_stage(args):
+    if args.dry_run:
+        _print_dry_run([args.command], args.shard)
+        return 0
+    options = {}
+    if args.command == "process":
+        options = {"dry_run": args.diff, "force": args.force}
+    report = _make_report(args)
+    _run_stage(args.command, shard=args.shard, report=report, **options)
+    _write_report(args, report)
+    return 0
+
+
+def cmd_run(args):
+    if args.dry_run:
+        _print_dry_run(PIPELINE)
+        return 0
+    report = RunReport() if args.report else None
+    for stage in PIPELINE:
+        print(f"\n===== {stage} =====")
+        _run_stage(stage, report=report)
+    if report:
+        report.write(args.report)
+    return 0
+
+
+def cmd_merge_reports(args):
+    """合并各分片的运行报告并输出汇总，有失败文件或缺失分片时返回 1。"""
+    summary = merge_reports(args.reports)
+    print_summary(summary)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+        print(f"汇总已保存到: {args.output}")
+    return 1 if summary["failed_files"] or summary["missing_shards"] else 0
+
+
+def cmd_watch(args):
+    from .watch_folder import main as watch_main
+    watch_main()
+    return 0
+
+
+def cmd_check(args):
+    """检查 .env 配置和各阶段目录，全部通过时返回 0。"""
+    ok = True
+    backend = os.environ.get("LOSS_STORE", "mongodb")
+    if backend == "mongodb":
+        for env_name in ("MONGODB_URI", "DB_NAME", "COLLECTION_NAME"):
+            if not os.getenv(env_name):
+                print(f"❌ 未设置 {env_name}")
+                ok = False
+    elif backend == "sqlite":
+        print(f"✅ 使用本地 SQLite 存储: {os.environ.get('SQLITE_PATH', 'loss_data.sqlite3')}")
+    else:
+        print(f"❌ 不支持的 LOSS_STORE: {backend}，可选值为 mongodb 或 sqlite")
+        ok = False
+
+    # 与 file_processor.read_highlight_mode 的规则一致，这里不导入 file_processor 以免加载 openpyxl
+    highlight_mode = os.environ.get("HIGHLIGHT_MODE", "cell")
+    if highlight_mode.strip().lower() not in ("cell", "conditional"):
+        print(f"❌ 不支持的 HIGHLIGHT_MODE: {highlight_mode}，可选值为 cell 或 conditional")
+        ok = False
+
+    for stage in PIPELINE:
+        problems = check_stage(stage)
+        if problems:
+            ok = False
+            for problem in problems:
+                print(f"❌ [{stage}] {problem}")
+        else:
+            print(f"✅ [{stage}] 待处理文件 {len(discover_files(stage))} 个")
+
+    return 0 if ok else 1
+
+
+def cmd_bench_startup(args):
+    from .benchmark import bench_startup
+    bench_startup(repeat=args.repeat)
+    return 0
+
+
+def cmd_bench_store(args):
+    from .benchmark import bench_stores
+    bench_stores(lookups=args.lookups)
+    return 0
+
+
+def _add_shard_arguments(parser):
+    parser.add_argument("--shard", type=_shard_arg, metavar="i/N",
+                        help="只处理第 i 个分片（共 N 个），按文件相对路径的哈希稳定划分")
+    parser.add_argument("--report", metavar="PATH",
+                        help="运行报告保存路径；指定 --shard 时默认 run-report-shard-i-of-N.json")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="excel", description="Excel 批量处理工具")
+    subparsers = parser.add_subparsers(dest="command", metavar="<command>")
+    subparsers.required = True
+
+    stage_help = {
+        "convert": "将 .xls 文件转换为 .xlsx（CONVERT_FILE → OUTPUT_FILE）",
+        "format": "取消模版文件中的合并单元格（INPUT_DIRECTORY → OUTPUT_DIRECTORY）",
+        "insert": "将格式化后的模版文件导入损失数据存储（OUTPUT_DIRECTORY → MongoDB/SQLite）",
+        "process": "处理业务文件（DATA_DIRECTORY → _DATA_DIRECTORY）",
+    }
+    for stage in PIPELINE:
+        stage_parser = subparsers.add_parser(stage, help=stage_help[stage])
+        stage_parser.add_argument("--dry-run", action="store_true", help="只列出将要处理的文件，不执行")
+        if stage == "process":
+            diff_group = stage_parser.add_mutually_exclusive_group()
+            diff_group.add_argument("--diff", action="store_true", help="计算新列值并报告与已有输出相比变化的单元格，不保存")
+            diff_group.add_argument("--force", action="store_true", help="跳过变化检测，重新保存所有文件")
+        _add_shard_arguments(stage_parser)
+        stage_parser.set_defaults(func=cmd_stage)
+
+    run_parser = subparsers.add_parser("run", help="依次执行 convert → format → insert → process")
+    run_parser.add_argument("--dry-run", action="store_true", help="只列出各阶段将要处理的文件，不执行")
+    # run 不支持分片：后续阶段的输入由各机器前一阶段写出，process 还依赖全部模版已导入，
+    # 多机并行时应逐个阶段分片执行，所有机器完成一个阶段后再开始下一个
+    run_parser.add_argument("--report", metavar="PATH", help="运行报告保存路径")
+    run_parser.set_defaults(func=cmd_run)
+
+    merge_parser = subparsers.add_parser("merge-reports", help="合并各分片的运行报告")
+    merge_parser.add_argument("reports", nargs="+", help="各分片输出的运行报告（JSON）")
+    merge_parser.add_argument("-o", "--output", help="汇总结果保存路径（JSON）")
+    merge_parser.set_defaults(func=cmd_merge_reports)
+
+    watch_parser = subparsers.add_parser("watch", help="常驻监听模式，新文件落地后自动执行完整流程")
+    watch_parser.set_defaults(func=cmd_watch)
+
+    check_parser = subparsers.add_parser("check", help="检查 .env 配置和各阶段目录")
+    check_parser.set_defaults(func=cmd_check)
+
+    bench_parser = subparsers.add_parser("bench-startup", help="测量命令行启动耗时")
+    bench_parser.add_argument("--repeat", type=int, default=5, help="每个命令的重复次数（默认 5）")
+    bench_parser.set_defaults(func=cmd_bench_startup)
+
+    bench_store_parser = subparsers.add_parser("bench-store", help="对比 MongoDB 与本地 SQLite 的查询耗时")
+    bench_store_parser.add_argument("--lookups", type=int, default=1000, help="每个存储查询的农户数量（默认 1000）")
+    bench_store_parser.set_defaults(func=cmd_bench_store)
+
+    return parser
+
+
+def main(argv=None):
+    load_dotenv()
+    args = build_parser().parse_args(argv)
+    sys.exit(args.func(args))
+
+
+if __name__ == "__main__":
+    main()
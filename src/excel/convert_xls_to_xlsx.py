@@ -5,7 +5,35 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
-def convert_xls_to_xlsx_mac(folder_path, output_folder):
+def convert_file(xls_path, xlsx_output_path):
+    """
+    将单个 .xls 文件的所有工作表转换并写入 .xlsx 文件。
+
+    Args:
+        xls_path (str): 源 .xls 文件路径。
+        xlsx_output_path (str): 转换后的 .xlsx 文件路径。
+
+    Returns:
+        bool: 转换成功返回 True，否则返回 False。
+    """
+    try:
+        print(f"正在转换：'{xls_path}' 到 '{xlsx_output_path}'...")
+        # 读取所有工作表
+        xls = pd.ExcelFile(xls_path)
+        writer = pd.ExcelWriter(xlsx_output_path, engine='openpyxl')
+
+        for sheet_name in xls.sheet_names:
+            df = xls.parse(sheet_name)
+            df.to_excel(writer, sheet_name=sheet_name, index=False) # index=False 避免写入 DataFrame 索引
+
+        writer.close() # 确保关闭 ExcelWriter 来保存文件
+        print("转换成功。")
+        return True
+    except Exception as e:
+        print(f"转换 '{xls_path}' 时发生错误：{e}")
+        return False
+
+def convert_xls_to_xlsx_mac(folder_path, output_folder, selected_files=None, report=None):
     """
     在 Mac 上将指定文件夹及其子文件夹中的所有 .xls 文件转换为 .xlsx 格式。
     此方法使用 pandas 和 openpyxl/xlrd，不依赖于 Microsoft Excel 应用程序。
@@ -14,6 +42,8 @@ def convert_xls_to_xlsx_mac(folder_path, output_folder):
         folder_path (str): 包含 .xls 文件的文件夹路径。
         output_folder (str): 转换后的 .xlsx 文件保存的文件夹路径。
                              如果不存在，脚本将尝试创建。
+        selected_files (set[str], optional): 只转换这些文件（例如分片运行时分配给本机的文件），为空时转换全部。
+        report (RunReport, optional): 记录每个文件的处理结果。
     """
 
     if not os.path.isdir(folder_path):
@@ -41,6 +71,8 @@ def convert_xls_to_xlsx_mac(folder_path, output_folder):
         for file in files:
             if file.lower().endswith(".xls"):
                 xls_path = os.path.join(root, file)
+                if selected_files is not None and xls_path not in selected_files:
+                    continue
 
                 # 构建在输出文件夹中的完整 .xlsx 路径
                 # 保持原始文件在源文件夹中的相对路径结构
@@ -53,24 +85,18 @@ def convert_xls_to_xlsx_mac(folder_path, output_folder):
                 if os.path.exists(xlsx_output_path):
                     print(f"跳过：'{xlsx_output_path}' 对应的 .xlsx 文件已存在于输出目录。")
                     skipped_count += 1
+                    if report:
+                        report.record("convert", xls_path, "skipped")
                     continue
 
-                try:
-                    print(f"正在转换：'{xls_path}' 到 '{xlsx_output_path}'...")
-                    # 读取所有工作表
-                    xls = pd.ExcelFile(xls_path)
-                    writer = pd.ExcelWriter(xlsx_output_path, engine='openpyxl')
-
-                    for sheet_name in xls.sheet_names:
-                        df = xls.parse(sheet_name)
-                        df.to_excel(writer, sheet_name=sheet_name, index=False) # index=False 避免写入 DataFrame 索引
-
-                    writer.close() # 确保关闭 ExcelWriter 来保存文件
-                    print("转换成功。")
+                if convert_file(xls_path, xlsx_output_path):
                     converted_count += 1
-                except Exception as e:
-                    print(f"转换 '{xls_path}' 时发生错误：{e}")
+                    if report:
+                        report.record("convert", xls_path, "ok")
+                else:
                     error_count += 1
+                    if report:
+                        report.record("convert", xls_path, "failed")
 
     print("\n--- 转换摘要 ---")
     print(f"成功转换文件数：{converted_count}")
@@ -80,10 +106,11 @@ def convert_xls_to_xlsx_mac(folder_path, output_folder):
     return True
 
 # --- 主函数 ---
-def main():
+def main(selected_files=None, report=None):
     """
     脚本的入口点。
     根据命令行参数或当前目录执行 .xls 到 .xlsx 的转换。
+    selected_files 和 report 的含义见 convert_xls_to_xlsx_mac。
     """
 
     # 您可以在这里修改这两个路径以适应您的需求
@@ -96,7 +123,7 @@ def main():
     print(target_folder, output_folder)
 
     print("\n--- 开始 .xls 到 .xlsx 转换 ---")
-    success = convert_xls_to_xlsx_mac(target_folder, output_folder)
+    success = convert_xls_to_xlsx_mac(target_folder, output_folder, selected_files=selected_files, report=report)
 
     if success:
         print("\n所有 .xls 文件转换完成（或跳过）。")
@@ -0,0 +1,63 @@
+import os
+
+# 这个模块只依赖标准库，供命令行的 --dry-run 和 check 使用，
+# 不会触发 pandas / openpyxl / pymongo 的导入。
+
+# 各阶段的输入目录、输出目录环境变量以及处理的文件扩展名
+STAGES = {
+    "convert": {"input": "CONVERT_FILE", "output": "OUTPUT_FILE", "extensions": (".xls",), "recursive": True},
+    "format": {"input": "INPUT_DIRECTORY", "output": "OUTPUT_DIRECTORY", "extensions": (".xlsx",), "recursive": False},
+    "insert": {"input": "OUTPUT_DIRECTORY", "output": None, "extensions": (".xls", ".xlsx"), "recursive": False},
+    "process": {"input": "DATA_DIRECTORY", "output": "_DATA_DIRECTORY", "extensions": (".xlsx", ".xls"), "recursive": False},
+}
+
+
+def discover_files(stage):
+    """
+    列出某个阶段将要处理的文件，规则与对应脚本的遍历逻辑一致。
+
+    Args:
+        stage (str): 阶段名称，见 STAGES。
+
+    Returns:
+        list[str]: 排序后的文件完整路径列表；输入目录未配置或不存在时返回空列表。
+    """
+    config = STAGES[stage]
+    folder = os.getenv(config["input"])
+    if not folder or not os.path.isdir(folder):
+        return []
+
+    extensions = config["extensions"]
+    if config["recursive"]:
+        paths = [
+            os.path.join(root, file)
+            for root, _, files in os.walk(folder)
+            for file in files
+            if file.lower().endswith(extensions)
+        ]
+    else:
+        paths = [
+            os.path.join(folder, file)
+            for file in os.listdir(folder)
+            if file.endswith(extensions)
+        ]
+    return sorted(paths)
+
+
+def check_stage(stage):
+    """
+    检查某个阶段的目录配置，返回问题描述列表，没有问题时返回空列表。
+    """
+    config = STAGES[stage]
+    problems = []
+
+    folder = os.getenv(config["input"])
+    if not folder:
+        problems.append(f"未设置 {config['input']}")
+    elif not os.path.isdir(folder):
+        problems.append(f"{config['input']} 目录不存在: {folder}")
+
+    if config["output"] and not os.getenv(config["output"]):
+        problems.append(f"未设置 {config['output']}")
+
+    return problems
@@ -1,17 +1,19 @@
-import pandas as pd
-from pymongo import MongoClient
 import re
 import os
 from openpyxl import load_workbook
 from openpyxl.styles import PatternFill, Font, Alignment
+from openpyxl.formatting.rule import FormulaRule
 from openpyxl.utils import get_column_letter
-from openpyxl.worksheet.merge import MergeCells
 from openpyxl.utils import range_boundaries
 from dotenv import load_dotenv
-import os
+from .loss_store import open_store
+from .change_detection import is_output_current, read_output_values, diff_values, print_changes
 
 load_dotenv() # 这会加载 .env 文件中的所有变量到 os.environ
 
+# process_file 支持的高亮方式
+HIGHLIGHT_MODES = ("cell", "conditional")
+
 def apply_styles(ws):
     """
     应用 Excel 文件的样式设置。
@@ -105,174 +107,297 @@ def apply_styles(ws):
         print("警告: 未找到 '身份证号码' 列，无法单独设置其宽度。")
 
 
-def main():
+def village_of(filename):
+    """从业务文件名中提取行政村名称（“村委会”统一为“村”），提取不到时返回 None。"""
+    match = re.match(r"^(.*?村)", filename)
+    if not match:
+        return None
+    return match.group(1).replace("村委会", "村")
+
+
+def process_file(file_path, output_path, store, insurance_amount_factor, dry_run=False, force=False, highlight_mode="cell"):
+    """
+    处理单个业务文件：新增“赔款金额”和“损失程度”列，应用样式并保存到输出目录。
+    如果输出文件已是最新且计算出的列值与其完全一致，则跳过样式设置和保存。
+    Args:
+        file_path (str): 待处理的 Excel 文件路径。
+        output_path (str): 处理后文件保存的目录。
+        store: 损失数据存储（loss_store.LossStore），MongoDB 或本地 SQLite。
+        insurance_amount_factor (int): 赔款金额系数。
+        dry_run (bool): 只计算并报告变化的单元格，不保存文件。
+        force (bool): 不做变化检测，总是重新保存。
+        highlight_mode (str): 匹配行的高亮方式。"cell" 逐个单元格设置填充色；
+            "conditional" 写入隐藏的“匹配标记”列，并用一条条件格式规则高亮整行。
+    Returns:
+        str: 处理结果，与运行报告中的状态一致。
+            "ok" 处理成功（包括无变化而跳过保存）；
+            "skipped" 文件名中没有行政村或损失数据中没有该村的记录；
+            "failed" 缺少必要的列或处理出错。
+    """
+    filename = os.path.basename(file_path)
+    print(f"正在处理文件: {filename}")
+
+    try:
+        # 提取行政村关键字
+        village_name = village_of(filename)
+        if village_name is None:
+            print(f"警告: 文件名 '{filename}' 未能提取到行政村信息，跳过。")
+            return "skipped"
+
+        # 从损失数据存储中查找数据
+        loss_data = store.find_village(village_name)
+        if not loss_data:
+            print(f"警告: 在损失数据中未找到与 '{village_name}' 匹配的数据，跳过文件 '{filename}'。")
+            return "skipped"
+
+        # 加载 Excel 文件 (使用 openpyxl 进行写入和格式化)
+        wb = load_workbook(file_path)
+        ws = wb.active
+
+        # 找到表头行（第五行）
+        header_row_index = 5
+        # 获取原始的表头，用于确定现有列的数量
+        original_headers = [cell.value for cell in ws[header_row_index]]
+        
+        # 清理原始表头，去除空格、换行符
+        cleaned_original_headers = [str(h).strip().replace('\n', '').replace('\r', '') if h is not None else '' for h in original_headers]
+
+        # --- 新增“赔款金额”列 ---
+        new_col_name_payment = "赔款金额"
+        payment_amount_col_idx = -1 # 初始化，表示未找到
+        
+        # 检查“赔款金额”是否已存在
+        if new_col_name_payment not in cleaned_original_headers:
+            # 如果不存在，则在现有列的末尾添加新列
+            payment_amount_col_idx = len(original_headers) + 1
+            ws.cell(row=header_row_index, column=payment_amount_col_idx, value=new_col_name_payment)
+            # 同时更新第六行，因为第五行和第六行会合并
+            ws.cell(row=header_row_index + 1, column=payment_amount_col_idx, value=new_col_name_payment)
+        else:
+            # 如果已存在，找到其索引
+            payment_amount_col_idx = cleaned_original_headers.index(new_col_name_payment) + 1
+
+        # --- 查找或新增“损失程度”列 ---
+        loss_degree_col_name = "损失程度"
+        loss_degree_col_idx = -1 # 初始化
+        
+        # 重新获取当前最新的表头（可能已经添加了“赔款金额”）
+        current_headers_for_loss_degree_check = [cell.value for cell in ws[header_row_index]]
+        cleaned_current_headers_for_loss_degree_check = [str(h).strip().replace('\n', '').replace('\r', '') if h is not None else '' for h in current_headers_for_loss_degree_check]
+
+        if loss_degree_col_name not in cleaned_current_headers_for_loss_degree_check:
+            # 如果不存在，则在当前列的末尾添加新列
+            loss_degree_col_idx = len(current_headers_for_loss_degree_check) + 1
+            ws.cell(row=header_row_index, column=loss_degree_col_idx, value=loss_degree_col_name)
+            # 同时更新第六行
+            ws.cell(row=header_row_index + 1, column=loss_degree_col_idx, value=loss_degree_col_name)
+        else:
+            # 如果已存在，找到其索引
+            loss_degree_col_idx = cleaned_current_headers_for_loss_degree_check.index(loss_degree_col_name) + 1
+
+        # --- 条件格式模式下查找或新增隐藏的“匹配标记”列 ---
+        match_flag_col_name = "匹配标记"
+        match_flag_col_idx = -1
+        if highlight_mode == "conditional":
+            current_headers_for_flag_check = [cell.value for cell in ws[header_row_index]]
+            cleaned_current_headers_for_flag_check = [str(h).strip().replace('\n', '').replace('\r', '') if h is not None else '' for h in current_headers_for_flag_check]
+
+            if match_flag_col_name not in cleaned_current_headers_for_flag_check:
+                match_flag_col_idx = len(current_headers_for_flag_check) + 1
+                ws.cell(row=header_row_index, column=match_flag_col_idx, value=match_flag_col_name)
+                ws.cell(row=header_row_index + 1, column=match_flag_col_idx, value=match_flag_col_name)
+            else:
+                match_flag_col_idx = cleaned_current_headers_for_flag_check.index(match_flag_col_name) + 1
+
+
+        # 现在，重新获取完整的、最新的表头，用于查找“被保险人”和“投保面积”的索引
+        # 确保在所有新列添加完毕后再获取一次，这样索引才是正确的
+        final_headers = [cell.value for cell in ws[header_row_index]]
+        cleaned_final_headers = [str(h).strip().replace('\n', '').replace('\r', '') if h is not None else '' for h in final_headers]
+
+
+        # 查找相关列的索引
+        try:
+            insured_person_col_idx = cleaned_final_headers.index("被保险人") + 1 # +1 是因为 openpyxl 是从 1 开始计数
+            insurance_area_col_idx = cleaned_final_headers.index("投保面积") + 1
+        except ValueError as e:
+            print(f"错误: 文件 '{filename}' 中缺少必要的列 '被保险人' 或 '投保面积'。{e}")
+            return "failed"
+        
+        # 定义浅黄色填充
+        light_yellow_fill = PatternFill(start_color="FFFFCC", end_color="FFFFCC", fill_type="solid")
+
+        # 遍历数据行（从第六行开始）
+        # 注意：数据从 header_row_index + 1 开始，即第 6 行
+        for r_idx in range(header_row_index + 1, ws.max_row + 1):
+            # 检查是否是空行
+            if all(cell.value is None for cell in ws[r_idx]):
+                continue
+
+            # 获取当前行的“被保险人”和“投保面积”
+            insured_person = ws.cell(row=r_idx, column=insured_person_col_idx).value
+            insurance_area = ws.cell(row=r_idx, column=insurance_area_col_idx).value
+
+            # 处理“被保险人”字段的潜在类型问题
+            if insured_person is not None:
+                insured_person = str(insured_person).strip()
+
+            # 填充“赔款金额”
+            # 确保只填充到“赔款金额”列
+            if isinstance(insurance_area, (int, float)):
+                ws.cell(row=r_idx, column=payment_amount_col_idx, value=insurance_area * insurance_amount_factor)
+            else:
+                ws.cell(row=r_idx, column=payment_amount_col_idx, value="") # 如果投保面积无效，则留空
+
+            # 填充“损失程度”
+            loss_percentage_value = ""
+            found_match = False
+            for data_item in loss_data:
+                # 处理数据库中可能存在的类型问题
+                farmer_name_from_db = str(data_item.get("farmer_name", "")).strip()
+                if insured_person == farmer_name_from_db:
+                    loss_percentage = data_item.get("loss_percentage")
+                    if isinstance(loss_percentage, (int, float)):
+                        # 四舍五入到小数点后一位，然后乘以100格式化为百分比
+                        loss_percentage_value = f"{round(loss_percentage * 100, 1):.1f}%"
+                    else:
+                        loss_percentage_value = ""
+                    ws.cell(row=r_idx, column=loss_degree_col_idx, value=loss_percentage_value)
+                    if highlight_mode == "conditional":
+                        # 只写入匹配标记，背景色由条件格式统一设置
+                        ws.cell(row=r_idx, column=match_flag_col_idx, value=1)
+                    else:
+                        # 设置背景色为浅黄色
+                        for cell in ws[r_idx]:
+                            cell.fill = light_yellow_fill
+                    found_match = True
+                    break
+
+            if not found_match and loss_data:
+                # 如果没有匹配，填写任意一个 avg_loss_same_level
+                avg_loss_same_level = loss_data[0].get("avg_loss_same_level")
+                if isinstance(avg_loss_same_level, (int, float)):
+                    # 四舍五入到小数点后一位，然后乘以100格式化为百分比
+                    loss_percentage_value = f"{round(avg_loss_same_level * 100, 1):.1f}%"
+                else:
+                    loss_percentage_value = ""
+                ws.cell(row=r_idx, column=loss_degree_col_idx, value=loss_percentage_value)
+            elif not found_match and not loss_data:
+                ws.cell(row=r_idx, column=loss_degree_col_idx, value="") # 如果损失数据为空，则留空
+
+            if not found_match and highlight_mode == "conditional":
+                ws.cell(row=r_idx, column=match_flag_col_idx, value=None)
+
+        if highlight_mode == "conditional":
+            # 一条条件格式规则覆盖全部数据行：匹配标记为 1 的行显示浅黄色背景，
+            # 效果与逐个单元格填充相同，但不会为每个单元格生成单独的样式
+            first_row = header_row_index + 1
+            flag_col_letter = get_column_letter(match_flag_col_idx)
+            highlight_range = f"A{first_row}:{get_column_letter(ws.max_column)}{ws.max_row}"
+            ws.conditional_formatting.add(
+                highlight_range,
+                FormulaRule(formula=[f"${flag_col_letter}{first_row}=1"], fill=light_yellow_fill),
+            )
+            ws.column_dimensions[flag_col_letter].hidden = True
+
+        output_file_path = os.path.join(output_path, filename)
+
+        # --- 变化检测 ---
+        # 第六行会与第五行合并为表头，写入其中的值不会保留，因此从第七行开始比较
+        if not force:
+            first_data_row = header_row_index + 2
+            column_indexes = {new_col_name_payment: payment_amount_col_idx, loss_degree_col_name: loss_degree_col_idx}
+            if highlight_mode == "conditional":
+                column_indexes[match_flag_col_name] = match_flag_col_idx
+            new_values = {
+                (r_idx, header): ws.cell(row=r_idx, column=col_idx).value
+                for r_idx in range(first_data_row, ws.max_row + 1)
+                for header, col_idx in column_indexes.items()
+            }
+
+            if is_output_current(file_path, output_file_path):
+                old_values, output_headers = read_output_values(
+                    output_file_path, list(column_indexes) + [match_flag_col_name], header_row_index, first_data_row)
+                # 输出文件含“匹配标记”列说明上次使用条件格式高亮，高亮方式改变时必须重新生成
+                output_highlight_mode = "conditional" if match_flag_col_name in output_headers else "cell"
+                changes = diff_values(old_values, new_values, column_indexes)
+                if output_highlight_mode != highlight_mode:
+                    print(f"文件 '{filename}' 的高亮方式由 {output_highlight_mode} 改为 {highlight_mode}，需要重新生成。")
+                elif not changes:
+                    print(f"文件 '{filename}' 的计算结果与已有输出一致，跳过保存。")
+                    return "ok"
+                if changes:
+                    print_changes(filename, changes)
+            elif dry_run:
+                print(f"文件 '{filename}' 的输出文件不存在或早于源文件，将重新生成（{len(new_values)} 个计算单元格）。")
+
+        # dry_run 时无论是否 force 都不保存
+        if dry_run:
+            return "ok"
+
+        # 应用样式
+        apply_styles(ws)
+
+        # 保存处理后的文件
+        wb.save(output_file_path)
+        print(f"文件 '{filename}' 处理完成，已保存到: {output_file_path}")
+        return "ok"
+
+    except Exception as e:
+        print(f"处理文件 '{filename}' 时发生错误: {e}")
+        return "failed"
+
+
+def read_highlight_mode():
+    """
+    读取 .env 中的 HIGHLIGHT_MODE（默认 cell），忽略大小写和首尾空格。
+    不是 cell 或 conditional 时输出提示并返回 None。
+    """
+    highlight_mode = os.environ.get("HIGHLIGHT_MODE", "cell").strip().lower()
+    if highlight_mode not in HIGHLIGHT_MODES:
+        print(f"❌ 不支持的 HIGHLIGHT_MODE: {os.environ.get('HIGHLIGHT_MODE')}，可选值为 cell 或 conditional。")
+        return None
+    return highlight_mode
+
+
+def main(dry_run=False, force=False, selected_files=None, report=None):
+    """
+    处理 DATA_DIRECTORY 中的所有业务文件。
+    Args:
+        dry_run (bool): 只报告每个文件中变化的单元格，不保存。
+        force (bool): 跳过变化检测，重新保存所有文件。
+        selected_files (set[str], optional): 只处理这些文件（例如分片运行时分配给本机的文件），为空时处理全部。
+        report (RunReport, optional): 记录每个文件的处理结果。
+    """
     # --- 配置参数 ---
     
-    mongodb_uri = os.getenv("MONGODB_URI")
-    db_name = os.getenv("DB_NAME")
-    collection_name = os.getenv("COLLECTION_NAME")
-
     path = os.getenv("DATA_DIRECTORY") # 存放Excel文件的目录
     output_path = os.getenv("_DATA_DIRECTORY") # 存放Excel文件的目录
     INSURANCE_AMOUNT_FACTOR = int(os.environ.get("INSURANCE_AMOUNT_FACTOR", "17"))
+    HIGHLIGHT_MODE = read_highlight_mode() # cell 或 conditional
+    if HIGHLIGHT_MODE is None:
+        return
 
     # 确保输出目录存在
     os.makedirs(output_path, exist_ok=True)
 
-    # 连接 MongoDB
-    client = MongoClient(mongodb_uri)
-    db = client[db_name]
-    collection = db[collection_name]
+    # 连接损失数据存储（LOSS_STORE=mongodb 或 sqlite）
+    store = open_store()
+    if store is None:
+        return
 
     # 遍历处理目录下的所有 Excel 文件
     for filename in os.listdir(path):
         if filename.endswith(('.xlsx', '.xls')):
             file_path = os.path.join(path, filename)
-            print(f"正在处理文件: {filename}")
-
-            try:
-                # 提取行政村关键字
-                match = re.match(r"^(.*?村)", filename)
-                if not match:
-                    print(f"警告: 文件名 '{filename}' 未能提取到行政村信息，跳过。")
-                    continue
-                village_name = match.group(1).replace("村委会", "村")
-
-                # 从 MongoDB 查找数据
-                mongo_data = list(collection.find({"village": village_name}))
-                if not mongo_data:
-                    print(f"警告: 在 MongoDB 中未找到与 '{village_name}' 匹配的数据，跳过文件 '{filename}'。")
-                    continue
-
-                # 加载 Excel 文件 (使用 openpyxl 进行写入和格式化)
-                wb = load_workbook(file_path)
-                ws = wb.active
-
-                # 找到表头行（第五行）
-                header_row_index = 5
-                # 获取原始的表头，用于确定现有列的数量
-                original_headers = [cell.value for cell in ws[header_row_index]]
-                
-                # 清理原始表头，去除空格、换行符
-                cleaned_original_headers = [str(h).strip().replace('\n', '').replace('\r', '') if h is not None else '' for h in original_headers]
-
-                # --- 新增“赔款金额”列 ---
-                new_col_name_payment = "赔款金额"
-                payment_amount_col_idx = -1 # 初始化，表示未找到
-                
-                # 检查“赔款金额”是否已存在
-                if new_col_name_payment not in cleaned_original_headers:
-                    # 如果不存在，则在现有列的末尾添加新列
-                    payment_amount_col_idx = len(original_headers) + 1
-                    ws.cell(row=header_row_index, column=payment_amount_col_idx, value=new_col_name_payment)
-                    # 同时更新第六行，因为第五行和第六行会合并
-                    ws.cell(row=header_row_index + 1, column=payment_amount_col_idx, value=new_col_name_payment)
-                else:
-                    # 如果已存在，找到其索引
-                    payment_amount_col_idx = cleaned_original_headers.index(new_col_name_payment) + 1
-
-                # --- 查找或新增“损失程度”列 ---
-                loss_degree_col_name = "损失程度"
-                loss_degree_col_idx = -1 # 初始化
-                
-                # 重新获取当前最新的表头（可能已经添加了“赔款金额”）
-                current_headers_for_loss_degree_check = [cell.value for cell in ws[header_row_index]]
-                cleaned_current_headers_for_loss_degree_check = [str(h).strip().replace('\n', '').replace('\r', '') if h is not None else '' for h in current_headers_for_loss_degree_check]
-
-                if loss_degree_col_name not in cleaned_current_headers_for_loss_degree_check:
-                    # 如果不存在，则在当前列的末尾添加新列
-                    loss_degree_col_idx = len(current_headers_for_loss_degree_check) + 1
-                    ws.cell(row=header_row_index, column=loss_degree_col_idx, value=loss_degree_col_name)
-                    # 同时更新第六行
-                    ws.cell(row=header_row_index + 1, column=loss_degree_col_idx, value=loss_degree_col_name)
-                else:
-                    # 如果已存在，找到其索引
-                    loss_degree_col_idx = cleaned_current_headers_for_loss_degree_check.index(loss_degree_col_name) + 1
-
-
-                # 现在，重新获取完整的、最新的表头，用于查找“被保险人”和“投保面积”的索引
-                # 确保在所有新列添加完毕后再获取一次，这样索引才是正确的
-                final_headers = [cell.value for cell in ws[header_row_index]]
-                cleaned_final_headers = [str(h).strip().replace('\n', '').replace('\r', '') if h is not None else '' for h in final_headers]
-
-
-                # 查找相关列的索引
-                try:
-                    insured_person_col_idx = cleaned_final_headers.index("被保险人") + 1 # +1 是因为 openpyxl 是从 1 开始计数
-                    insurance_area_col_idx = cleaned_final_headers.index("投保面积") + 1
-                except ValueError as e:
-                    print(f"错误: 文件 '{filename}' 中缺少必要的列 '被保险人' 或 '投保面积'。{e}")
-                    continue
-                
-                # 定义浅黄色填充
-                light_yellow_fill = PatternFill(start_color="FFFFCC", end_color="FFFFCC", fill_type="solid")
-
-                # 遍历数据行（从第六行开始）
-                # 注意：数据从 header_row_index + 1 开始，即第 6 行
-                for r_idx in range(header_row_index + 1, ws.max_row + 1):
-                    # 检查是否是空行
-                    if all(cell.value is None for cell in ws[r_idx]):
-                        continue
-
-                    # 获取当前行的“被保险人”和“投保面积”
-                    insured_person = ws.cell(row=r_idx, column=insured_person_col_idx).value
-                    insurance_area = ws.cell(row=r_idx, column=insurance_area_col_idx).value
-
-                    # 处理“被保险人”字段的潜在类型问题
-                    if insured_person is not None:
-                        insured_person = str(insured_person).strip()
-
-                    # 填充“赔款金额”
-                    # 确保只填充到“赔款金额”列
-                    if isinstance(insurance_area, (int, float)):
-                        ws.cell(row=r_idx, column=payment_amount_col_idx, value=insurance_area * INSURANCE_AMOUNT_FACTOR)
-                    else:
-                        ws.cell(row=r_idx, column=payment_amount_col_idx, value="") # 如果投保面积无效，则留空
-
-                    # 填充“损失程度”
-                    loss_percentage_value = ""
-                    found_match = False
-                    for data_item in mongo_data:
-                        # 处理MongoDB中可能存在的类型问题
-                        farmer_name_from_db = str(data_item.get("farmer_name", "")).strip()
-                        if insured_person == farmer_name_from_db:
-                            loss_percentage = data_item.get("loss_percentage")
-                            if isinstance(loss_percentage, (int, float)):
-                                # 四舍五入到小数点后一位，然后乘以100格式化为百分比
-                                loss_percentage_value = f"{round(loss_percentage * 100, 1):.1f}%"
-                            else:
-                                loss_percentage_value = ""
-                            ws.cell(row=r_idx, column=loss_degree_col_idx, value=loss_percentage_value)
-                            # 设置背景色为浅黄色
-                            for cell in ws[r_idx]:
-                                cell.fill = light_yellow_fill
-                            found_match = True
-                            break
-
-                    if not found_match and mongo_data:
-                        # 如果没有匹配，填写任意一个 avg_loss_same_level
-                        avg_loss_same_level = mongo_data[0].get("avg_loss_same_level")
-                        if isinstance(avg_loss_same_level, (int, float)):
-                            # 四舍五入到小数点后一位，然后乘以100格式化为百分比
-                            loss_percentage_value = f"{round(avg_loss_same_level * 100, 1):.1f}%"
-                        else:
-                            loss_percentage_value = ""
-                        ws.cell(row=r_idx, column=loss_degree_col_idx, value=loss_percentage_value)
-                    elif not found_match and not mongo_data:
-                        ws.cell(row=r_idx, column=loss_degree_col_idx, value="") # 如果MongoDB数据为空，则留空
-
-                # 应用样式
-                apply_styles(ws)
-
-                # 保存处理后的文件
-                output_file_path = os.path.join(output_path, filename)
-                wb.save(output_file_path)
-                print(f"文件 '{filename}' 处理完成，已保存到: {output_file_path}")
-
-            except Exception as e:
-                print(f"处理文件 '{filename}' 时发生错误: {e}")
-
-    client.close()
+            if selected_files is not None and file_path not in selected_files:
+                continue
+            status = process_file(file_path, output_path, store, INSURANCE_AMOUNT_FACTOR,
+                                  dry_run=dry_run, force=force, highlight_mode=HIGHLIGHT_MODE)
+            if report:
+                report.record("process", file_path, status)
+
+    store.close()
     print("所有文件处理完毕。")
 
 if __name__ == "__main__":
@@ -1,18 +1,25 @@
 import pandas as pd
-from pymongo import MongoClient
 from datetime import datetime
 import math
 from dotenv import load_dotenv
 import os
 from openpyxl import load_workbook
+from .loss_store import MongoLossStore, open_store
 
 load_dotenv()  # 加载.env文件
 
 def excel_to_mongodb(excel_file, mongodb_uri, db_name, collection_name):
-    client = MongoClient(mongodb_uri)
-    db = client[db_name]
-    collection = db[collection_name]
+    store = MongoLossStore(mongodb_uri, db_name, collection_name)
 
+    excel_to_store(excel_file, store)
+
+    store.close()
+
+
+def read_loss_documents(excel_file):
+    """
+    解析单个模版文件，返回损失数据记录列表；读取失败时返回 None。
+    """
     try:
         wb = load_workbook(excel_file, data_only=True)
         sheet = wb.active
@@ -21,8 +28,7 @@ def excel_to_mongodb(excel_file, mongodb_uri, db_name, collection_name):
         df = pd.DataFrame(data, columns=columns)
     except Exception as e:
         print(f"读取文件 {excel_file} 时出错: {e}")
-        client.close()
-        return
+        return None
 
     df.columns = df.columns.str.strip().str.replace(r'\s+', '_', regex=True)
     df['村委'] = df['村委'].ffill()
@@ -61,50 +67,77 @@ def excel_to_mongodb(excel_file, mongodb_uri, db_name, collection_name):
 
         documents.append(doc)
 
-    if documents:
-        try:
-            result = collection.insert_many(documents)
-            print(f"✅ 成功插入 {os.path.basename(excel_file)} 中的 {len(result.inserted_ids)} 条记录。")
-        except Exception as e:
-            print(f"❌ 插入文档出错: {e}")
-    else:
+    return documents
+
+
+def excel_to_store(excel_file, store, replace=False):
+    """
+    读取单个模版文件并写入已打开的损失数据存储（见 loss_store），调用方负责关闭存储。
+    replace 为 True 时先解析文件，解析成功后才替换该文件之前导入的记录，读取失败时已有记录保持不变。
+    返回成功插入的记录数；文件中没有数据时返回 0，读取或写入出错时返回 None。
+    """
+    documents = read_loss_documents(excel_file)
+    if documents is None:
+        return None
+
+    try:
+        if replace:
+            inserted_count = store.replace_source(os.path.basename(excel_file), documents)
+        elif documents:
+            inserted_count = store.insert_many(documents)
+        else:
+            inserted_count = 0
+    except Exception as e:
+        print(f"❌ 插入文档出错: {e}")
+        return None
+
+    if not inserted_count:
         print(f"⚠️ 没有可插入的数据: {excel_file}")
+        return 0
 
-    client.close()
+    print(f"✅ 成功插入 {os.path.basename(excel_file)} 中的 {inserted_count} 条记录。")
+    return inserted_count
 
 
 def create_mongodb_indexes(mongodb_uri, db_name, collection_name):
-    client = MongoClient(mongodb_uri)
-    db = client[db_name]
-    collection = db[collection_name]
-
-    print("正在创建MongoDB索引...")
-    collection.create_index([("township", 1)])
-    collection.create_index([("village", 1)])
-    collection.create_index([("risk_date", 1)])
-    collection.create_index([("farmer_name", 1)])
-    collection.create_index([("loss_percentage", 1)])
-    print("✅ 索引创建完成。")
-    client.close()
-
-
-def main():
-    mongodb_uri = os.getenv("MONGODB_URI")
-    db_name = os.getenv("DB_NAME")
-    collection_name = os.getenv("COLLECTION_NAME")
+    store = MongoLossStore(mongodb_uri, db_name, collection_name)
+    store.create_indexes()
+    store.close()
+
+
+def main(selected_files=None, report=None):
+    """
+    将 OUTPUT_DIRECTORY 中的模版文件导入损失数据存储。
+    selected_files 为空时导入全部文件，否则只导入其中的文件；report 用于记录每个文件的结果。
+    """
     excel_directory = os.getenv("OUTPUT_DIRECTORY")
 
-    if not all([mongodb_uri, db_name, collection_name, excel_directory]):
-        print("❌ .env 配置项不完整，请确保包含 MONGODB_URI、DB_NAME、COLLECTION_NAME 和 OUTPUT_DIRECTORY。")
+    if not excel_directory:
+        print("❌ .env 配置项不完整，请确保包含 OUTPUT_DIRECTORY。")
+        return
+
+    # 根据 LOSS_STORE 选择 MongoDB 或本地 SQLite
+    store = open_store()
+    if store is None:
         return
 
-    create_mongodb_indexes(mongodb_uri, db_name, collection_name)
+    store.create_indexes()
 
     for filename in os.listdir(excel_directory):
         if filename.endswith(".xls") or filename.endswith(".xlsx"):
             file_path = os.path.join(excel_directory, filename)
+            if selected_files is not None and file_path not in selected_files:
+                continue
             print(f"📄 正在处理: {file_path}")
-            excel_to_mongodb(file_path, mongodb_uri, db_name, collection_name)
+            # 替换该文件之前导入的记录，重复执行不会产生重复数据
+            inserted_count = excel_to_store(file_path, store, replace=True)
+            if report:
+                if inserted_count is None:
+                    report.record("insert", file_path, "failed")
+                else:
+                    report.record("insert", file_path, "ok" if inserted_count else "skipped")
+
+    store.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,208 @@
+import os
+import sqlite3
+from abc import ABC, abstractmethod
+from datetime import datetime
+
+# 损失数据记录的字段，与 insert_mongodb 从模版文件解析出的文档字段一致
+FIELDS = (
+    "township",
+    "village",
+    "risk_date",
+    "growth_stage",
+    "loss_level",
+    "farmer_name",
+    "plot_name",
+    "average_spikes_per_mu",
+    "average_grains_per_spike",
+    "thousand_grain_weight",
+    "current_yield_kg_per_mu",
+    "historical_yield_kg_per_mu",
+    "loss_percentage",
+    "avg_loss_same_level",
+    "source_file",
+    "import_date",
+    "is_calculated_yield",
+    "is_calculated_loss",
+)
+
+
+class LossStore(ABC):
+    """
+    村/农户损失数据的存储接口。file_processor 和 insert_mongodb 只通过这些方法访问数据，
+    因此可以在 MongoDB 和本地 SQLite 之间切换。
+    """
+
+    @abstractmethod
+    def find_village(self, village):
+        """返回某个行政村的全部记录（dict 列表），按导入顺序排列。"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def find_farmer(self, village, farmer_name):
+        """返回某个行政村中指定农户的记录（dict 列表）。"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def keys(self, limit=None):
+        """返回已存储记录的 (village, farmer_name) 列表，用于基准测试取样。"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def insert_many(self, documents):
+        """批量写入记录，返回写入的条数。"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete_source(self, source_file):
+        """删除某个模版文件导入的全部记录。"""
+        raise NotImplementedError
+
+    def replace_source(self, source_file, documents):
+        """
+        用 documents 替换某个模版文件之前导入的全部记录，返回写入的条数。
+        默认依次调用 delete_source 和 insert_many，支持事务的实现应在同一事务中完成。
+        """
+        self.delete_source(source_file)
+        return self.insert_many(documents) if documents else 0
+
+    @abstractmethod
+    def create_indexes(self):
+        """创建查询所需的索引（已存在时忽略）。"""
+        raise NotImplementedError
+
+    def close(self):
+        """释放连接，默认不做任何事。"""
+        pass
+
+
+class MongoLossStore(LossStore):
+    """基于 MongoDB collection 的实现。"""
+
+    def __init__(self, mongodb_uri, db_name, collection_name):
+        from pymongo import MongoClient  # 仅在使用 MongoDB 时才需要 pymongo
+
+        self.client = MongoClient(mongodb_uri)
+        self.collection = self.client[db_name][collection_name]
+
+    def find_village(self, village):
+        return list(self.collection.find({"village": village}))
+
+    def find_farmer(self, village, farmer_name):
+        return list(self.collection.find({"village": village, "farmer_name": farmer_name}))
+
+    def keys(self, limit=None):
+        cursor = self.collection.find({}, {"village": 1, "farmer_name": 1, "_id": 0})
+        if limit:
+            cursor = cursor.limit(limit)
+        return [(doc.get("village"), doc.get("farmer_name")) for doc in cursor]
+
+    def insert_many(self, documents):
+        result = self.collection.insert_many(documents)
+        return len(result.inserted_ids)
+
+    def delete_source(self, source_file):
+        self.collection.delete_many({"source_file": source_file})
+
+    def create_indexes(self):
+        print("正在创建MongoDB索引...")
+        self.collection.create_index([("township", 1)])
+        self.collection.create_index([("village", 1)])
+        self.collection.create_index([("risk_date", 1)])
+        self.collection.create_index([("farmer_name", 1)])
+        self.collection.create_index([("loss_percentage", 1)])
+        self.collection.create_index([("village", 1), ("farmer_name", 1)])
+        print("✅ 索引创建完成。")
+
+    def close(self):
+        self.client.close()
+
+
+class SQLiteLossStore(LossStore):
+    """
+    基于本地 SQLite 文件的实现，不需要 MongoDB 服务，适用于离线工作站和 CI。
+    日期字段以 ISO 格式字符串保存。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.row_factory = sqlite3.Row
+        columns = ", ".join(FIELDS)
+        self.connection.execute(f"CREATE TABLE IF NOT EXISTS loss_data (id INTEGER PRIMARY KEY AUTOINCREMENT, {columns})")
+        self.create_indexes()
+
+    def _query(self, where, params):
+        rows = self.connection.execute(f"SELECT {', '.join(FIELDS)} FROM loss_data WHERE {where} ORDER BY id", params)
+        return [dict(row) for row in rows]
+
+    def find_village(self, village):
+        return self._query("village = ?", (village,))
+
+    def find_farmer(self, village, farmer_name):
+        return self._query("village = ? AND farmer_name = ?", (village, farmer_name))
+
+    def keys(self, limit=None):
+        sql = "SELECT village, farmer_name FROM loss_data ORDER BY id"
+        params = ()
+        if limit:
+            sql += " LIMIT ?"
+            params = (limit,)
+        return [tuple(row) for row in self.connection.execute(sql, params)]
+
+    def _insert_rows(self, documents):
+        def to_sql_value(value):
+            if isinstance(value, datetime):
+                return value.isoformat()
+            return value
+
+        rows = [tuple(to_sql_value(doc.get(field)) for field in FIELDS) for doc in documents]
+        placeholders = ", ".join("?" for _ in FIELDS)
+        self.connection.executemany(f"INSERT INTO loss_data ({', '.join(FIELDS)}) VALUES ({placeholders})", rows)
+        return len(rows)
+
+    def insert_many(self, documents):
+        with self.connection:
+            return self._insert_rows(documents)
+
+    def delete_source(self, source_file):
+        with self.connection:
+            self.connection.execute("DELETE FROM loss_data WHERE source_file = ?", (source_file,))
+
+    def replace_source(self, source_file, documents):
+        # 删除和写入在同一事务中完成，写入失败时旧记录保持不变
+        with self.connection:
+            self.connection.execute("DELETE FROM loss_data WHERE source_file = ?", (source_file,))
+            return self._insert_rows(documents)
+
+    def create_indexes(self):
+        with self.connection:
+            self.connection.execute("CREATE INDEX IF NOT EXISTS idx_village_farmer ON loss_data (village, farmer_name)")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS idx_source_file ON loss_data (source_file)")
+
+    def close(self):
+        self.connection.close()
+
+
+def open_store():
+    """
+    根据 .env 中的 LOSS_STORE 打开损失数据存储：
+    - mongodb（默认）：使用 MONGODB_URI、DB_NAME、COLLECTION_NAME
+    - sqlite：使用 SQLITE_PATH（默认 loss_data.sqlite3）
+    配置不完整时输出提示并返回 None。
+    """
+    backend = os.environ.get("LOSS_STORE", "mongodb")
+
+    if backend == "sqlite":
+        return SQLiteLossStore(os.environ.get("SQLITE_PATH", "loss_data.sqlite3"))
+
+    if backend == "mongodb":
+        mongodb_uri = os.getenv("MONGODB_URI")
+        db_name = os.getenv("DB_NAME")
+        collection_name = os.getenv("COLLECTION_NAME")
+        if not all([mongodb_uri, db_name, collection_name]):
+            print("❌ .env 配置项不完整，请确保包含 MONGODB_URI、DB_NAME 和 COLLECTION_NAME。")
+            return None
+        return MongoLossStore(mongodb_uri, db_name, collection_name)
+
+    print(f"❌ 不支持的 LOSS_STORE: {backend}，可选值为 mongodb 或 sqlite。")
+    return None
@@ -1,7 +1,6 @@
 import openpyxl
-import re
 import os
-from openpyxl.utils import get_column_letter, column_index_from_string
+from openpyxl.utils import range_boundaries
 from dotenv import load_dotenv # 导入 load_dotenv
 
 def unmerge_and_fill_with_original_format(input_filepath: str, output_filepath: str):
@@ -12,6 +11,9 @@ def unmerge_and_fill_with_original_format(input_filepath: str, output_filepath:
     Args:
         input_filepath (str): 包含合并单元格的输入 .xlsx 文件路径。
         output_filepath (str): 保存处理后的 .xlsx 文件的路径。
+
+    Returns:
+        bool: 处理并保存成功返回 True，否则返回 False。
     """
     try:
         # 加载工作簿
@@ -24,17 +26,7 @@ def unmerge_and_fill_with_original_format(input_filepath: str, output_filepath:
         # 遍历每个合并单元格范围字符串
         for merged_range_str in merged_ranges_str:
             # 解析单元格范围字符串以获取 min_col, min_row, max_col, max_row
-            try:
-                from openpyxl.utils.cell import range_boundaries
-                min_col, min_row, max_col, max_row = range_boundaries(merged_range_str)
-            except ImportError:
-                # 兼容旧版 openpyxl 的备用方案
-                col_start, row_start, col_end, row_end = re.match(r"([A-Z]+)(\d+):([A-Z]+)(\d+)", merged_range_str).groups()
-
-                min_col = column_index_from_string(col_start)
-                min_row = int(row_start)
-                max_col = column_index_from_string(col_end)
-                max_row = int(row_end)
+            min_col, min_row, max_col, max_row = range_boundaries(merged_range_str)
 
             # 获取合并区域的左上角单元格
             top_left_cell = sheet.cell(row=min_row, column=min_col)
@@ -54,15 +46,21 @@ def unmerge_and_fill_with_original_format(input_filepath: str, output_filepath:
         # 保存修改后的工作簿
         workbook.save(output_filepath)
         print(f"成功处理并保存到: {output_filepath}")
+        return True
 
     except FileNotFoundError:
         print(f"错误: 未找到输入文件 {input_filepath}")
     except Exception as e:
         print(f"处理文件 {input_filepath} 时发生错误: {e}")
+    return False
 
-def main():
+def main(selected_files=None, report=None):
     """
     主函数，用于对指定目录中所有 .xlsx 文件执行取消合并和填充脚本。
+
+    Args:
+        selected_files (set[str], optional): 只处理这些文件（例如分片运行时分配给本机的文件），为空时处理全部。
+        report (RunReport, optional): 记录每个文件的处理结果。
     """
     # 加载 .env 文件中的环境变量
     load_dotenv() 
@@ -83,9 +81,13 @@ def main():
         if filename.endswith(".xlsx"):
             input_file_path = os.path.join(input_directory, filename)
             output_file_path = os.path.join(output_directory, filename)
-            
+            if selected_files is not None and input_file_path not in selected_files:
+                continue
+
             print(f"正在处理文件: {filename}")
-            unmerge_and_fill_with_original_format(input_file_path, output_file_path)
+            success = unmerge_and_fill_with_original_format(input_file_path, output_file_path)
+            if report:
+                report.record("format", input_file_path, "ok" if success else "failed")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
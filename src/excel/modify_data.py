@@ -3,6 +3,7 @@ import openpyxl
 from openpyxl.utils import get_column_letter
 from openpyxl.styles import Font, Alignment
 from openpyxl.worksheet.cell_range import CellRange
+from .change_detection import values_equal, print_changes
 
 def clean_header_string(header_str):
     """
@@ -76,7 +77,7 @@ def apply_excel_styles(sheet, header_rows, output_col_idx):
         sheet.column_dimensions[col_letter].width = 15
 
 
-def batch_process_excel_add_column(folder_path, insurance_area_header, compensation_factor, output_column_header, header_rows=[5, 6], output_path):
+def batch_process_excel_add_column(folder_path, insurance_area_header, compensation_factor, output_column_header, header_rows=[5, 6], output_path=None, dry_run=False):
     """
     批量处理Excel文件，新增“赔偿金额”列并根据投保面积和自定义赔偿系数计算填充数据。
     不会修改表格内的其他原有内容。
@@ -85,6 +86,9 @@ def batch_process_excel_add_column(folder_path, insurance_area_header, compensat
     :param compensation_factor: 自定义的赔偿系数（浮点数）
     :param output_column_header: 赔偿金额的表头名称（例如 "赔偿金额"）
     :param header_rows: 表头可能存在的行列表（例如 [5, 6]）
+    :param output_path: 输出目录，为空时直接覆盖原文件
+    :param dry_run: 只报告变化的单元格，不保存文件
+    原地保存时，计算结果与现有内容一致的工作表不会重新应用样式，没有任何变化的文件不会重新保存。
     """
     processed_files = 0
 
@@ -98,6 +102,11 @@ def batch_process_excel_add_column(folder_path, insurance_area_header, compensat
 
             try:
                 wb = openpyxl.load_workbook(filepath)
+                file_changes = []
+                save_path = os.path.join(output_path, filename) if output_path else filepath
+                # 变化是相对源文件计算的，只有原地保存时才能跳过无变化的工作表和文件；
+                # 保存到 output_path 时始终应用样式并保存，保证输出文件完整
+                skip_unchanged = save_path == filepath
 
                 for sheet_name in wb.sheetnames:
                     sheet = wb[sheet_name]
@@ -144,6 +153,7 @@ def batch_process_excel_add_column(folder_path, insurance_area_header, compensat
                         output_col_idx = max_col_on_sheet + 1
                         sheet.insert_cols(output_col_idx)
                         sheet.cell(row=actual_header_row_for_data_start, column=output_col_idx, value=output_column_header)
+                        file_changes.append((f"{get_column_letter(output_col_idx)}{actual_header_row_for_data_start}", None, output_column_header))
                         print(f"文件 {filename} 工作表 {sheet_name} 已创建新列 '{output_column_header}' 在 {get_column_letter(output_col_idx)} 列。")
                     else:
                         print(f"文件 {filename} 工作表 {sheet_name} 中 '{output_column_header}' 列已存在于 {get_column_letter(output_col_idx)} 列，将覆盖原有数据。")
@@ -154,21 +164,40 @@ def batch_process_excel_add_column(folder_path, insurance_area_header, compensat
                         print(f"警告: 文件 {filename} 工作表 {sheet_name} 在 '{data_start_row}' 行之后没有找到数据，跳过计算。")
                         continue
 
+                    sheet_change_count = len(file_changes)
                     for row_idx in range(data_start_row, max_row + 1):
                         insurance_area_value = sheet.cell(row=row_idx, column=insurance_area_col_idx).value
 
                         if isinstance(insurance_area_value, (int, float)):
                             compensation_amount = insurance_area_value * compensation_factor
-                            sheet.cell(row=row_idx, column=output_col_idx, value=round(compensation_amount, 2))
+                            new_value = round(compensation_amount, 2)
                         else:
-                            sheet.cell(row=row_idx, column=output_col_idx, value="数据错误")
+                            new_value = "数据错误"
+
+                        # 只写入发生变化的单元格，并记录变化
+                        cell = sheet.cell(row=row_idx, column=output_col_idx)
+                        if not values_equal(cell.value, new_value):
+                            file_changes.append((cell.coordinate, cell.value, new_value))
+                            cell.value = new_value
+
+                    if len(file_changes) == sheet_change_count and skip_unchanged:
+                        print(f"    工作表 {sheet_name} 的计算结果没有变化，跳过样式设置。")
+                        continue
 
                     # Apply styles after data processing
                     print(f"    正在为工作表 {sheet_name} 应用样式...")
                     apply_excel_styles(sheet, header_rows, output_col_idx) # Call the new styling function
 
 
-                wb.save(filepath)
+                if file_changes:
+                    print_changes(filename, file_changes)
+                if dry_run:
+                    continue
+                if not file_changes and skip_unchanged:
+                    print(f"文件 {filename} 没有变化，跳过保存。")
+                    continue
+
+                wb.save(save_path)
                 processed_files += 1
                 print(f"处理成功: {filename}")
 
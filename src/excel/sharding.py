@@ -0,0 +1,141 @@
+import hashlib
+import json
+import os
+import socket
+from datetime import datetime
+
+# 这个模块只依赖标准库。每个文件的分片只取决于它自身的相对路径，
+# 共享同一文件系统的多台机器各自计算即可得到一致且互不重叠的划分，不需要协调服务。
+
+
+def parse_shard(value):
+    """
+    解析 "i/N" 形式的分片参数（i 从 1 开始），返回 (i, N)。
+    格式错误时抛出 ValueError。
+    """
+    try:
+        index_text, count_text = value.split("/")
+        index, count = int(index_text), int(count_text)
+    except ValueError:
+        raise ValueError(f"分片参数格式应为 i/N，例如 1/4，实际为: {value}")
+    if count < 1 or not 1 <= index <= count:
+        raise ValueError(f"分片编号应在 1 到 {count} 之间，实际为: {value}")
+    return index, count
+
+
+def shard_of(path, root, count):
+    """
+    返回文件所属的分片编号（从 1 开始）。
+    只由文件相对 root 的路径的 sha1 决定，与目录中其他文件无关，
+    因此各机器看到的文件集合略有差异（例如有文件仍在写入）时，已有文件的归属也不会改变。
+    """
+    relative_path = os.path.relpath(path, root).replace(os.sep, "/")
+    # 使用 sha1 而不是内置 hash()，后者在不同进程间带随机种子
+    digest = hashlib.sha1(relative_path.encode("utf-8")).hexdigest()
+    return int(digest, 16) % count + 1
+
+
+def select_shard(paths, root, index, count):
+    """返回属于第 index 个分片（共 count 个）的文件，保持原有顺序。"""
+    return [path for path in paths if shard_of(path, root, count) == index]
+
+
+class RunReport:
+    """
+    记录一次（分片）运行中每个文件的处理结果，可写出为 JSON，供 merge_reports 汇总。
+    """
+
+    def __init__(self, shard=None):
+        self.shard = shard  # (i, N) 或 None
+        self.host = socket.gethostname()
+        self.started_at = datetime.now().isoformat(timespec="seconds")
+        self.stages = {}   # 阶段名称 -> 用时（秒）
+        self.files = []
+
+    def record(self, stage, path, status):
+        """记录单个文件的处理结果，status 为 ok / skipped / failed。"""
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            size = 0
+        self.files.append({"stage": stage, "path": path, "size": size, "status": status})
+
+    def stage_finished(self, stage, seconds):
+        self.stages[stage] = round(seconds, 3)
+
+    def write(self, report_path):
+        data = {
+            "shard": list(self.shard) if self.shard else None,
+            "host": self.host,
+            "started_at": self.started_at,
+            "finished_at": datetime.now().isoformat(timespec="seconds"),
+            "stages": self.stages,
+            "files": self.files,
+        }
+        with open(report_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        print(f"运行报告已保存到: {report_path}")
+
+
+def default_report_path(shard):
+    if shard:
+        return f"run-report-shard-{shard[0]}-of-{shard[1]}.json"
+    return "run-report.json"
+
+
+def merge_reports(report_paths):
+    """
+    合并多个分片的运行报告，返回汇总字典：
+    各阶段各状态的文件数和数据量、每个阶段最慢分片的用时、缺失或重复的分片编号。
+    """
+    reports = []
+    for report_path in report_paths:
+        with open(report_path, encoding="utf-8") as f:
+            reports.append(json.load(f))
+
+    shard_counts = {report["shard"][1] for report in reports if report.get("shard")}
+    shard_indexes = [report["shard"][0] for report in reports if report.get("shard")]
+    expected = set(range(1, max(shard_counts) + 1)) if shard_counts else set()
+
+    stages = {}
+    for report in reports:
+        for entry in report["files"]:
+            stage = stages.setdefault(entry["stage"], {"files": 0, "bytes": 0, "status": {}, "slowest_shard_seconds": 0})
+            stage["files"] += 1
+            stage["bytes"] += entry["size"]
+            stage["status"][entry["status"]] = stage["status"].get(entry["status"], 0) + 1
+        for stage_name, seconds in report.get("stages", {}).items():
+            stage = stages.setdefault(stage_name, {"files": 0, "bytes": 0, "status": {}, "slowest_shard_seconds": 0})
+            stage["slowest_shard_seconds"] = max(stage["slowest_shard_seconds"], seconds)
+
+    return {
+        "reports": len(reports),
+        "shard_count": sorted(shard_counts),
+        "missing_shards": sorted(expected - set(shard_indexes)),
+        "duplicate_shards": sorted({i for i in shard_indexes if shard_indexes.count(i) > 1}),
+        "hosts": sorted({report.get("host") for report in reports}),
+        "stages": stages,
+        "failed_files": [
+            entry["path"] for report in reports for entry in report["files"] if entry["status"] == "failed"
+        ],
+    }
+
+
+def print_summary(summary):
+    print(f"共合并 {summary['reports']} 份报告，来自主机: {', '.join(str(h) for h in summary['hosts'])}")
+    if len(summary["shard_count"]) > 1:
+        print(f"⚠️ 报告的分片总数不一致: {summary['shard_count']}")
+    if summary["missing_shards"]:
+        print(f"⚠️ 缺少分片: {summary['missing_shards']}")
+    if summary["duplicate_shards"]:
+        print(f"⚠️ 重复的分片: {summary['duplicate_shards']}")
+
+    for stage_name, stage in summary["stages"].items():
+        status_text = "，".join(f"{status} {count}" for status, count in sorted(stage["status"].items()))
+        print(f"[{stage_name}] 文件 {stage['files']} 个（{stage['bytes'] / 1024 / 1024:.1f} MB）：{status_text or '无'}；"
+              f"最慢分片用时 {stage['slowest_shard_seconds']:.1f} 秒")
+
+    if summary["failed_files"]:
+        print(f"失败的文件（{len(summary['failed_files'])} 个）:")
+        for path in summary["failed_files"]:
+            print(f"  {path}")
@@ -0,0 +1,245 @@
+import math
+import os
+import time
+from dotenv import load_dotenv
+
+from .convert_xls_to_xlsx import convert_file
+from .merged_cell_range import unmerge_and_fill_with_original_format
+from .insert_mongodb import excel_to_store
+from .file_processor import process_file, read_highlight_mode, village_of
+from .loss_store import open_store
+
+load_dotenv()
+
+
+class FolderWatcher:
+    """
+    以轮询方式监听目录中新增或被修改的 Excel 文件。
+    文件的大小和修改时间在 settle_seconds 秒内保持不变后才视为写入完成，
+    避免处理仍在复制中的半成品文件。
+    """
+
+    def __init__(self, folder, extensions, settle_seconds=3.0, recursive=False):
+        self.folder = folder
+        self.extensions = tuple(ext.lower() for ext in extensions)
+        self.settle_seconds = settle_seconds
+        self.recursive = recursive
+        self._pending = {}  # path -> (签名, 首次观察到该签名的时间)
+        self._done = {}     # path -> 已处理时的签名
+        self._failed = {}   # path -> (处理失败时的签名, 允许重试的时间)
+
+    def _scan(self):
+        """返回目录中所有符合扩展名的文件及其 (大小, 修改时间) 签名。"""
+        found = {}
+        if not os.path.isdir(self.folder):
+            return found
+
+        if self.recursive:
+            walker = os.walk(self.folder)
+        else:
+            walker = [(self.folder, None, os.listdir(self.folder))]
+
+        for root, _, files in walker:
+            for file in files:
+                # 忽略 Excel 打开文件时生成的 ~$ 锁文件和隐藏文件
+                if file.startswith(("~$", ".")) or not file.lower().endswith(self.extensions):
+                    continue
+                path = os.path.join(root, file)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue  # 文件在扫描过程中被移走
+                found[path] = (stat.st_size, stat.st_mtime_ns)
+        return found
+
+    def mark_existing(self):
+        """将目录中已有的文件标记为已处理，只关注启动之后新落地的文件。"""
+        self._done.update(self._scan())
+
+    def poll(self):
+        """
+        扫描一次目录，返回已经稳定、且自上次处理以来发生变化的文件列表。
+        """
+        now = time.monotonic()
+        found = self._scan()
+        ready = []
+
+        for path, signature in found.items():
+            if self._done.get(path) == signature:
+                continue
+            failed = self._failed.get(path)
+            if failed is not None:
+                if failed[0] == signature:
+                    if now >= failed[1]:
+                        # 到达重试时间，文件未变化，无需再次等待写入完成
+                        del self._failed[path]
+                        self._pending[path] = (signature, now)
+                        ready.append(path)
+                    continue
+                # 文件已被替换，按新文件重新等待写入完成
+                del self._failed[path]
+            pending = self._pending.get(path)
+            if pending is None or pending[0] != signature:
+                # 新文件或仍在写入，重新开始计时
+                self._pending[path] = (signature, now)
+            elif now - pending[1] >= self.settle_seconds:
+                ready.append(path)
+
+        # 清理已被删除的文件
+        for path in list(self._pending):
+            if path not in found:
+                del self._pending[path]
+        for path in list(self._done):
+            if path not in found:
+                del self._done[path]
+        for path in list(self._failed):
+            if path not in found:
+                del self._failed[path]
+
+        return sorted(ready)
+
+    def mark_done(self, path):
+        """记录文件处理时的签名，文件再次变化时才会重新处理。"""
+        signature = self._pending.pop(path, (None,))[0]
+        if signature is not None:
+            self._done[path] = signature
+
+    def mark_failed(self, path, retry_seconds):
+        """记录处理失败的文件，retry_seconds 秒后或调用 retry_failed 后重新处理。"""
+        signature = self._pending.pop(path, (None,))[0]
+        if signature is not None:
+            self._failed[path] = (signature, time.monotonic() + retry_seconds)
+
+    def retry_failed(self):
+        """让所有处理失败的文件在下一次轮询时立即重试。"""
+        for path, (signature, _) in self._failed.items():
+            self._failed[path] = (signature, 0)
+
+
+def _convert_stage(path, source_folder, output_folder):
+    relative_path = os.path.relpath(path, source_folder)
+    xlsx_output_path = os.path.join(output_folder, os.path.splitext(relative_path)[0] + ".xlsx")
+    os.makedirs(os.path.dirname(xlsx_output_path), exist_ok=True)
+
+    # 输出文件比源文件新时说明已经转换过
+    if os.path.exists(xlsx_output_path) and os.path.getmtime(xlsx_output_path) >= os.path.getmtime(path):
+        print(f"跳过：'{xlsx_output_path}' 已是最新。")
+        return "ok"
+    return "ok" if convert_file(path, xlsx_output_path) else "failed"
+
+
+def _format_stage(path, output_folder):
+    os.makedirs(output_folder, exist_ok=True)
+    output_file = os.path.join(output_folder, os.path.basename(path))
+    return "ok" if unmerge_and_fill_with_original_format(path, output_file) else "failed"
+
+
+def _insert_stage(path, store):
+    # 同一模版文件重新落地时替换旧记录，避免重复导入；新文件无法读取时保留旧记录
+    return "failed" if excel_to_store(path, store, replace=True) is None else "ok"
+
+
+def _process_stage(path, output_folder, store, insurance_amount_factor, highlight_mode):
+    os.makedirs(output_folder, exist_ok=True)
+    status = process_file(path, output_folder, store, insurance_amount_factor, highlight_mode=highlight_mode)
+    if status == "skipped" and village_of(os.path.basename(path)) is not None:
+        # 文件名中有行政村但存储中还没有该村的数据，对应模版可能尚未导入
+        return "waiting"
+    return status
+
+
+def main():
+    """
+    常驻监听模式：保持解释器、依赖库和损失数据存储连接常驻，
+    监听各输入目录，新文件落地后依次执行 转换 → 格式化 → 导入 → 处理。
+    """
+    convert_folder = os.getenv("CONVERT_FILE")          # 待转换的 .xls 文件
+    convert_output = os.getenv("OUTPUT_FILE")           # 转换后的 .xlsx 文件
+    template_folder = os.getenv("INPUT_DIRECTORY")      # 待格式化的模版文件
+    template_output = os.getenv("OUTPUT_DIRECTORY")     # 格式化后的模版文件，导入损失数据存储
+    data_folder = os.getenv("DATA_DIRECTORY")           # 待处理的业务文件
+    data_output = os.getenv("_DATA_DIRECTORY")          # 处理后的业务文件
+    INSURANCE_AMOUNT_FACTOR = int(os.environ.get("INSURANCE_AMOUNT_FACTOR", "17"))
+    HIGHLIGHT_MODE = read_highlight_mode()
+    if HIGHLIGHT_MODE is None:
+        return
+
+    poll_interval = float(os.environ.get("WATCH_INTERVAL", "2"))
+    settle_seconds = float(os.environ.get("WATCH_SETTLE_SECONDS", "3"))
+    include_existing = os.environ.get("WATCH_INCLUDE_EXISTING", "0") == "1"
+    retry_seconds = float(os.environ.get("WATCH_RETRY_SECONDS", "60"))
+
+    # 连接损失数据存储，整个监听过程中复用同一个连接
+    store = open_store()
+    if store is None:
+        return
+
+    # 各阶段按 转换 → 格式化 → 导入 → 处理 的顺序排列，
+    # 前一阶段的输出目录若是后一阶段的输入目录，文件会在后续轮询中自动流转。
+    # 每个阶段为 (名称, 监听器, 处理函数, 处理成功后的回调)，
+    # 处理函数返回 ok / skipped / failed，处理阶段还可能返回 waiting（等待对应模版导入）
+    data_watcher = FolderWatcher(data_folder, [".xlsx", ".xls"], settle_seconds) if data_folder and data_output else None
+    stages = []
+    if convert_folder and convert_output:
+        stages.append(("转换", FolderWatcher(convert_folder, [".xls"], settle_seconds, recursive=True),
+                       lambda p: _convert_stage(p, convert_folder, convert_output), None))
+    if template_folder and template_output:
+        stages.append(("格式化", FolderWatcher(template_folder, [".xlsx"], settle_seconds),
+                       lambda p: _format_stage(p, template_output), None))
+    if template_output:
+        # 业务文件常与模版同时落地，可能先于模版导入而处理失败；模版导入后立即重试这些文件
+        stages.append(("导入", FolderWatcher(template_output, [".xlsx", ".xls"], settle_seconds),
+                       lambda p: _insert_stage(p, store),
+                       data_watcher.retry_failed if data_watcher else None))
+    if data_watcher:
+        stages.append(("处理", data_watcher,
+                       lambda p: _process_stage(p, data_output, store, INSURANCE_AMOUNT_FACTOR, HIGHLIGHT_MODE), None))
+
+    if not stages:
+        print("❌ 未配置任何监听目录，请检查 .env 中的 CONVERT_FILE、INPUT_DIRECTORY、DATA_DIRECTORY 和 OUTPUT_DIRECTORY。")
+        store.close()
+        return
+
+    for stage_name, watcher, _, _ in stages:
+        if not include_existing:
+            watcher.mark_existing()
+        print(f"👀 [{stage_name}] 正在监听: {watcher.folder}")
+
+    print(f"监听已启动（轮询间隔 {poll_interval} 秒，稳定等待 {settle_seconds} 秒），按 Ctrl+C 退出。")
+
+    try:
+        while True:
+            for stage_name, watcher, handler, on_success in stages:
+                for path in watcher.poll():
+                    started = time.monotonic()
+                    print(f"📄 [{stage_name}] 检测到新文件: {path}")
+                    try:
+                        status = handler(path)
+                    except Exception as e:
+                        print(f"❌ [{stage_name}] 处理 '{path}' 时发生错误: {e}")
+                        status = "failed"
+
+                    if status == "ok":
+                        watcher.mark_done(path)
+                        if on_success:
+                            on_success()
+                    elif status == "skipped":
+                        # 重试也不会改变结果，文件再次变化时才重新处理
+                        watcher.mark_done(path)
+                    elif status == "waiting":
+                        # 不按时间重试，只在下一次模版导入成功后重试
+                        watcher.mark_failed(path, math.inf)
+                        print(f"[{stage_name}] '{path}' 将在对应模版导入后重试。")
+                    else:
+                        watcher.mark_failed(path, retry_seconds)
+                        print(f"[{stage_name}] '{path}' 处理未成功，将在 {retry_seconds:.0f} 秒后重试。")
+                    print(f"[{stage_name}] 用时 {time.monotonic() - started:.2f} 秒")
+            time.sleep(poll_interval)
+    except KeyboardInterrupt:
+        print("\n监听已停止。")
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()